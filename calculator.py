@@ -1,9 +1,30 @@
+import atexit
 import json
-from os import path, mkdir, name, system
-from configparser import ConfigParser, NoOptionError, NoSectionError
-from math import sin, cos, tan, radians, sqrt
+import operator
+from os import path, mkdir, name, replace, system
+from io import StringIO
+from sys import stdout
+from math import sin, cos, tan, sqrt, pi, isfinite
+from mmap import mmap, ACCESS_READ
+from collections import deque
+
+try:
+    from orjson import dumps as jsondumps, loads as jsonloads
+except ImportError:
+    jsonloads = json.loads
+
+    def jsondumps(obj: object) -> bytes:
+        '''
+        Serializes an object to utf-8 encoded json, same as orjson.dumps
+        :param obj: object to serialize
+        :return: json in bytes
+        '''
+        return json.dumps(obj).encode()
 
 VERSION = "1.1"
+HISTORY_SIZE = 5
+DEG2RAD = pi / 180.0
+CLEAR = "\x1b[2J\x1b[H"
 
 class ConfigManager:
     '''
@@ -15,26 +36,34 @@ class ConfigManager:
         Class constructor that inits config files
         '''
         self.__path = "calc_data/settings.ini"
-        self.__default_savepath = "\"calc_data/saved_actions.json\""
-        self.__config = ConfigParser()  
+        self.__default_savepath = "calc_data/saved_actions.json"
+        self.__fields: dict[str, str] = {}
 
         self.__initconfig()  
 
-    def __ensureoption(self, option: str, default: str) -> str:
+    def __ensureoption(self, option: str, default: str) -> bool:
         '''
         Ensures that a config option exists in Calculator section, if not, creates it with default value
-        :param config: ConfigParser object
         :param option: field to check
         :param default: default value for the field
-        :return: value of the option
+        :return: True if the option was missing and default value was set
         '''
-        try:
-            return self.__config.get("Calculator", option)
-        except (NoSectionError, NoOptionError):
-            if not self.__config.has_section("Calculator"):
-                self.__config.add_section("Calculator")
-            self.__config.set("Calculator", option, default)
-            return default
+        if option in self.__fields: return False
+
+        self.__fields[option] = default
+        return True
+
+    def __readconfig(self) -> None:
+        '''
+        Reads "key = value" lines of config at default __CONFIG_PATH into fields, stripping quotes from values
+        '''
+        if not path.exists(self.__path): return
+
+        with open(self.__path, 'r', encoding='utf-8') as ini:
+            for line in ini.read().splitlines():
+                key, sep, value = line.partition('=')
+                if not sep or line.lstrip().startswith(('#', ';')): continue
+                self.__fields[key.strip().lower()] = value.strip().strip('"')
 
     def __initconfig(self) -> None:
         '''
@@ -43,28 +72,30 @@ class ConfigManager:
         '''
         if not path.exists('calc_data'): mkdir('calc_data')
 
-        self.__config.read(self.__path)
+        self.__readconfig()
+
+        dirty = any([self.__ensureoption("showhistory", str(True)),
+                     self.__ensureoption("savepath", self.__default_savepath),
+                     self.__ensureoption("showentrysum", str(True))])
 
-        self.__ensureoption("showhistory", str(True))
-        self.__ensureoption("savepath", self.__default_savepath)
-        self.__ensureoption("showentrysum", str(True))
+        if dirty:
+            with open(self.__path, 'w', encoding='utf-8') as ini:
+                ini.write("[Calculator]\n" + "\n".join(f"{k} = {v}" for k, v in self.__fields.items()) + "\n")
 
-        with open(self.__path, 'w') as ini:
-            self.__config.write(ini)
+        self.show_history: bool = self.__fields["showhistory"].lower() == "true"
+        self.show_entry_sum: bool = self.__fields["showentrysum"].lower() == "true"
  
     def getconfigfield(self, field: str) -> str:
         '''
-        Reads field of config of calculator at default __CONFIG_PATH
+        Reads field of config of calculator from fields cached at init
         :param field: field to read
         :return: read data in string format
         '''
-        try:
-            self.__config.get("Calculator", field)
-        except (NoOptionError, NoSectionError):
+        value = self.__fields.get(field)
+        if value is None:
             print(f"Failed to read field '{field}' in {self.__path}")
-            return None
         
-        return self.__config.get("Calculator", field).replace('"', '')
+        return value
 
 class SaveManager:
     '''
@@ -76,6 +107,7 @@ class SaveManager:
         :param config: ConfigManager object to get configs from
         '''
         self.__config = configs
+        self.__actions: deque = deque(maxlen=HISTORY_SIZE)
 
         self.__initsaves()
 
@@ -84,56 +116,149 @@ class SaveManager:
         '''
         Creates save file at path in config file if it isn't present
         '''
-        try:
-            self.__path = self.__config.getconfigfield("savepath")
-        except NoOptionError:
+        self.__path = self.__config.getconfigfield("savepath")
+        if self.__path is None:
             print(f"Failed to read config path")
             quit()
-        except NoSectionError:
-            self.__path = self.__config.getconfigfield("savepath")
 
-        if not path.exists(self.__path):
-            with open(self.__path, 'a', encoding='utf-8'): pass
-        
-        with open(self.__path, 'r+', encoding='utf-8') as save:
-            if len(save.read()) == 0: json.dump({"actions": []}, save, indent=4)
+        if path.exists(self.__path):
+            with open(self.__path, 'rb') as rsave:
+                firstline = rsave.readline().strip()
+
+            if firstline and not self.__isentryline(firstline): self.__migratelegacy()
+
+        self.__fp = open(self.__path, 'a+b')
+        atexit.register(self.__fp.close)
+
+        # finish a torn last line, so the next appended entry doesn't get glued onto it
+        if self.__fp.seek(0, 2) > 0:
+            self.__fp.seek(-1, 2)
+            if self.__fp.read(1) != b"\n":
+                self.__fp.write(b"\n")
+                self.__fp.flush()
+
+        self.__actions.extend(self.__tailread(HISTORY_SIZE))
+
+    def __isentryline(self, line: bytes) -> bool:
+        '''
+        Checks if a line of save file is an entry in format {"action": action, "result": result}
+        :param line: line to check
+        :return: True if line is an entry
+        '''
+        try:
+            entry = jsonloads(line)
+        except ValueError:
+            return False
+
+        return isinstance(entry, dict) and "action" in entry
+
+    def __migratelegacy(self) -> None:
+        '''
+        Converts a save file in old {"actions": [...]} format to one json object per line, writing it to
+        a temporary file first so history isn't lost if conversion fails midway. Files that aren't
+        a whole {"actions": [...]} document are left as they are
+        '''
+        # old saves were written by standard json module and may hold Infinity/NaN, which orjson can't read
+        with open(self.__path, 'r', encoding='utf-8') as rsave:
+            try:
+                document = json.load(rsave)
+            except ValueError:
+                return
+
+        if not isinstance(document, dict) or "actions" not in document: return
+        legacy: list = document["actions"]
+
+        temppath = self.__path + ".tmp"
+        with open(temppath, 'wb') as wsave:
+            for entry in legacy:
+                action, result = next(iter(entry.items()))
+                if not isfinite(result): continue
+                wsave.write(jsondumps({"action": action, "result": result}) + b"\n")
+
+        replace(temppath, self.__path)
+
+    def __tailread(self, number: int) -> list[dict]:
+        '''
+        Reads last N of entries from save file, memory-mapping it so only the tail gets paged in
+        :param number: number of entries to read
+        :return: list of entries in format {"action": result}
+        '''
+        try:
+            with mmap(self.__fp.fileno(), 0, access=ACCESS_READ) as mm:
+                lines = self.__taillines(mm, number)
+        except (ValueError, OSError):
+            # mmap can't map empty files and isn't available for every file on every platform
+            self.__fp.seek(0)
+            lines = [line for line in self.__fp.read().splitlines() if line][-number:]
+
+        entries = []
+        for line in lines:
+            try:
+                entry: dict = jsonloads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict): continue
+            action, result = entry.get("action"), entry.get("result")
+            # skip incomplete entries and unreadable results, like null that orjson writes for inf/nan
+            if not isinstance(action, str) or not isinstance(result, (int, float)): continue
+            entries.append({action: result})
+
+        return entries
+
+    def __taillines(self, mm: mmap, number: int) -> list[bytes]:
+        '''
+        Finds last N of non-empty lines in memory-mapped file by searching newlines from its end
+        :param mm: memory-mapped save file
+        :param number: number of lines to find
+        :return: list of lines in file order
+        '''
+        lines = []
+        end = len(mm)
+        while end > 0 and len(lines) < number:
+            start = mm.rfind(b"\n", 0, end) + 1
+            if mm[start:end].strip(): lines.append(mm[start:end])
+            end = start - 1
+
+        lines.reverse()
+        return lines
 
     def saveaction(self, action: str, result: float) -> None:
         '''
-        Saves a calculator action in json file with format {"action": result}
+        Appends a calculator action to save file as a line with format {"action": action, "result": result}
         :param action: action to save
         :param result: result of action to save in float
         '''
-        with open(self.__path, 'r', encoding='utf-8') as rsave:
-            actionlist: list = json.load(rsave)["actions"]
-            actionlist.append({action: result})
-
-        with open(self.__path, 'w', encoding='utf-8') as wsave:
-            json.dump({"actions": actionlist}, wsave, indent=4)
+        self.__actions.append({action: result})
+        self.__fp.write(jsondumps({"action": action, "result": result}) + b"\n")
+        self.__fp.flush()
     
     def getentries(self, number: int) -> list[dict]:
         '''
-        Gets last N of entries from json save file
+        Gets last N of entries, from in-memory cache if it holds enough of them, otherwise from save file
         :param number: number of entries to get
-        :return: list of entries in string
+        :return: list of entries in format {"action": result}
         '''
-        with open(self.__path, 'r', encoding='utf-8') as rsave:
-            actionlist: list = json.load(rsave)["actions"]
-        
-        return actionlist[-number:]
+        if number > HISTORY_SIZE: return self.__tailread(number)
+
+        return list(self.__actions)[-number:]
     
     def clear(self) -> None:
         '''
         Clears the save file
         '''
-        with open(self.__path, 'w', encoding='utf-8') as wsave:
-            json.dump({"actions": []}, wsave, indent=4)
+        self.__actions.clear()
+        self.__fp.truncate(0)
 
 class CalculatorMethods:
     '''
     Class that implements calculator methods
     '''
 
+    # sign: (function, number of operands it takes)
+    _ACTIONS = {'+': (operator.add, 2), '-': (operator.sub, 2), '/': (operator.truediv, 2), '*': (operator.mul, 2), 
+                'sin': (lambda x: sin(x * DEG2RAD), 1), 'cos': (lambda x: cos(x * DEG2RAD), 1), 
+                'tan': (lambda x: tan(x * DEG2RAD), 1), 'sqrt': (sqrt, 1), 'stop': None, 'clear history': None}
+
     def __init__(self, saves: SaveManager, configs: ConfigManager) -> None:
         '''
         Class constructor
@@ -142,124 +267,58 @@ class CalculatorMethods:
         '''
         self.__saves = saves
         self.__configs = configs
-
-        self.__actionsigns = {'+': self.__add, '-': self.__subtract, '/': self.__divide, '*': self.__multiply, 
-                              'sin': self.__sin, 'cos': self.__cos, 'tan': self.__tan, 
-                              'sqrt': self.__sqrt, 'stop': None, 'clear history': None}
-
-    def __add(self, *args: float) -> float:
-        '''
-        Adds two numbers
-        :param 1: first number to add
-        :param 2: second number to add
-        :return: sum of param 1 and param 2
-        '''
-        return args[0] + args[1]
-
-    def __subtract(self, *args: float) -> float:
-        '''
-        Subtracts two numbers
-        :param 1: first number to subtract
-        :param 2: second number to subtract
-        :return: difference of param 1 and param 2
-        '''
-        return args[0] - args[1]
-
-    def __divide(self, *args: float) -> float:
-        '''
-        Divides two numbers
-        :param 1: first number to divide
-        :param 2: second number to divide
-        :return: quotient of param 1 and param 2
-        '''
-        return args[0] / args[1]
-
-    def __multiply(self, *args: float) -> float:
-        '''
-        Multiplies two numbers
-        :param 1: first number to multiply
-        :param 2: second number to multiply
-        :return: product of param 1 and param 2
-        '''
-        return args[0] * args[1]
-    
-    def __sin(self, *args: float) -> float:
-        '''
-        Calculates the sine of a number
-        :param 1: number to calculate the sine of (in degrees)
-        :return: sine of param 1
-        '''
-        return sin(radians(args[0]))
-    
-    def __cos(self, *args: float) -> float:
-        '''
-        Calculates the cosine of a number
-        :param 1: number to calculate the cosine of (in degrees)
-        :return: cosine of param 1
-        '''
-        return cos(radians(args[0]))
-    
-    def __tan(self, *args: float) -> float:
-        '''
-        Calculates the tangent of a number
-        :param 1: number to calculate the tangent of (in degrees)
-        :return: tangent of param 1
-        '''
-        return tan(radians(args[0]))
-    
-    def __sqrt(self, *args: float) -> float:
-        '''
-        Calculates the square root of a number
-        :param 1: number to calculate the square root of
-        :return: square root of param 1
-        '''
-        return sqrt(args[0])
+        menu = "\n".join(f"> {k}" for k in self._ACTIONS)
+        self.__header = (f"=============================\n   WARDEN-CALCULATOR V {VERSION}   \n=============================\n"
+                         f"\nAvailable actions:\n\n{menu}\n\nWARNING! sin, cos, tan are in degrees\n")
 
     def process(self) -> None:
         '''
         Gets user input, and then executes the calculator action and then saves it into json file
         '''
-        print('=============================')
-        print(f'   WARDEN-CALCULATOR V {VERSION}   ')
-        print('=============================')
-
-        print("\nAvailable actions:\n")
-        for i in self.__actionsigns.keys():
-            print(f"> {i}")
-
-        print("\nWARNING! sin, cos, tan are in degrees")
+        buf = StringIO()
+        buf.write(self.__header)
 
-        if self.__configs.getconfigfield("showhistory").capitalize() == str(True):
-            print("\nCalculator History (last 5 entries):")
-            for i in self.__saves.getentries(5):
-                print(f"{list(i.keys())[0]} = {list(i.values())[0]}")
+        if self.__configs.show_history:
+            buf.write(f"\nCalculator History (last {HISTORY_SIZE} entries):\n")
+            entries = self.__saves.getentries(HISTORY_SIZE)
+            for i in entries:
+                buf.write(f"{next(iter(i.keys()))} = {next(iter(i.values()))}\n")
 
-            if self.__configs.getconfigfield("showentrysum").capitalize() == str(True):
-                print(f"\nSum of entry results: {sum([list(d.values())[0] for d in self.__saves.getentries(5)])}")
+            if self.__configs.show_entry_sum:
+                buf.write(f"\nSum of entry results: {sum(next(iter(d.values())) for d in entries)}\n")
 
+        stdout.write(buf.getvalue())
         action: str = input("\nEnter the action(num action num / action num / action): ").lower()
+        command = action.strip()
+        if command == 'stop':
+            print("\nStopping the program...\n")
+            exit()
+        elif command in ['clear', 'clearhistory', 'clear history']:
+            print("\nCleared calculator history")
+            self.__saves.clear()
+            input("Press Enter to continue...")
+            return
+
         actionsplit = action.split(' ')
-        result = 0.0
         try:
-            if len(actionsplit) == 3 and all(not part.isalpha() for part in (actionsplit[0], actionsplit[2])) and actionsplit[1] \
-                in self.__actionsigns.keys():
-                if actionsplit[2] == "0": raise ZeroDivisionError()
-                result = self.__actionsigns[actionsplit[1]](float(actionsplit[0]), float(actionsplit[2]))
-            elif len(actionsplit) == 2 and actionsplit[0] in self.__actionsigns.keys() and not actionsplit[1].isalpha():
-                result = self.__actionsigns[actionsplit[0]](float(actionsplit[1]))     
-            elif len(actionsplit) == 1:  
-                if actionsplit[0] == 'stop':
-                    print("\nStopping the program...\n")
-                    exit()
-                elif actionsplit[0].strip().lower() in ['clear', 'clearhistory']:
-                    print("\nCleared calculator history")
-                    self.__saves.clear()
-                    input("Press Enter to continue...")
-                    return
-                else:
-                    raise ValueError("\nInvalid input, enter the action in format (num action num / action num / action)!")
-            else: raise ValueError("\nInvalid input, enter the action in format (num action num / action num / action)!")
-        except (ValueError, KeyError) as e:
+            sign = actionsplit[1] if len(actionsplit) == 3 else actionsplit[0]
+            actionentry = self._ACTIONS.get(sign)
+            if actionentry is None or len(actionsplit) != actionentry[1] + 1:
+                raise ValueError("\nInvalid input, enter the action in format (num action num / action num / action)!")
+            func, arity = actionentry
+
+            try:
+                operands = [float(part) for part in (actionsplit[0::2] if arity == 2 else actionsplit[1:])]
+            except ValueError:
+                raise ValueError("\nInvalid input, operands must be numbers!")
+            if not all(isfinite(operand) for operand in operands):
+                raise ValueError("\nInvalid input, operands must be finite numbers!")
+
+            if sign == '/' and operands[1] == 0.0: raise ZeroDivisionError()
+            result = func(*operands)
+            # orjson saves inf/nan as null, so non-finite results are never stored
+            if not isfinite(result): raise ValueError("\nMath Error: Result is too large")
+        except ValueError as e:
             print(str(e))
             input("Press Enter to continue...")
             return
@@ -280,6 +339,9 @@ class Main:
     saves = SaveManager(configs)
     calculator = CalculatorMethods(saves, configs)
 
+    # empty command makes Windows console enable ANSI escape sequences
+    if name == 'nt': system('')
+
     while True:
-        system('cls' if name == 'nt' else 'clear')
+        stdout.write(CLEAR)
         calculator.process()
\ No newline at end of file